@@ -1,6 +1,8 @@
 # === 1. Create DataFrames (5 points) ===
 import pandas as pd
 
+df_users = pd.DataFrame({"id": [1, 2], "name": ["Alice", "Bob"]})
+df_orders = pd.DataFrame({"user_id": [1, 1, 2], "total": [100, 150, 200]})
 
 print("✅ df_users:")
 print(df_users)
@@ -18,8 +20,13 @@ print(df_orders)
 # 2        2    200
 
 # === 2. Merge DataFrames (10 points) ===
-
-
+merged = df_users.merge(
+    df_orders,
+    left_on="id",
+    right_on="user_id",
+    how="inner",
+    validate="one_to_many",
+)
 
 print("\n✅ Merged DataFrame:")
 print(merged)
@@ -33,8 +40,13 @@ print(merged)
 # 3-1. Group by name (5 points)
 # 3-2. Aggregate: count and sum (10 points)
 # 3-3. Sort by total_spent descending (5 points)
-
-
+# Named aggregation yields flat column names; sort=False skips the group-key
+# sort since we sort by total_spent right after ("size" needs no null check)
+sorted_result = (
+    merged.groupby("name", sort=False, as_index=True)
+    .agg(num_orders=("total", "size"), total_spent=("total", "sum"))
+    .sort_values("total_spent", ascending=False, kind="stable")
+)
 
 print("\n✅ Sorted Result:")
 print(sorted_result)
@@ -45,8 +57,7 @@ print(sorted_result)
 # Bob             1          200
 
 # === 4. Print user with highest total spent (5 points) ===
-
-
+top_user = sorted_result.iloc[0]
 
 print("\n🏆 Top User:")
 print(top_user)
@@ -1,6 +1,19 @@
 # === 1. Join users with orders (15 points) ===
-
-
+from collections import defaultdict
+
+users = [
+    {"id": 1, "name": "Alice"},
+    {"id": 2, "name": "Bob"},
+]
+orders = [
+    {"user_id": 1, "total": 100},
+    {"user_id": 1, "total": 150},
+    {"user_id": 2, "total": 200},
+]
+
+# Map id -> name once, then probe it per order (O(U + O) instead of O(U * O))
+uid_to_name = {u["id"]: u["name"] for u in users}
+joined = [{"name": uid_to_name[o["user_id"]], "total": o["total"]} for o in orders]
 
 print("✅ Joined Result:")
 print(joined)
@@ -12,7 +25,11 @@ print(joined)
 # 2-2. Set the "name" in joined as the key in grouped (10 points)
 # 2-3. Set the initial value in grouped as a dictionary i.e. {"num_orders": 0, "total_spent": 0} (10 points)
 # 2-4. Increment the "num_orders" & "total_spent" (5 points)
-
+grouped = defaultdict(lambda: {"num_orders": 0, "total_spent": 0})
+for row in joined:
+    grouped[row["name"]]["num_orders"] += 1
+    grouped[row["name"]]["total_spent"] += row["total"]
+grouped = dict(grouped)  # plain dict so it prints as a literal
 
 print("\n✅ Grouped Result:")
 print(grouped)
@@ -22,8 +39,10 @@ print(grouped)
 # === 3. Sort by total_spent descending (15 points) ===
 # 3-1. Define sorting function (10 points)
 # 3-2. Apply sorting (5 points)
+def by_total_spent(item):
+    return item[1]["total_spent"]
 
-
+sorted_result = sorted(grouped.items(), key=by_total_spent, reverse=True)
 
 print("\n✅ Sorted Result:")
 print(sorted_result)
@@ -31,8 +50,7 @@ print(sorted_result)
 # [('Alice', {'num_orders': 2, 'total_spent': 250}), ('Bob', {'num_orders': 1, 'total_spent': 200})]
 
 # === 4. Print top user (10 points) ===
-
-
+top_user = sorted_result[0]
 
 print("\n🏆 Top User:")
 print(top_user)
@@ -1,19 +1,36 @@
 #!/usr/bin/env python3
+import argparse
 import ast
-import glob
+import contextlib
+import csv
+import faulthandler
+import importlib.machinery
+import importlib.metadata
+import io
+import json
+import multiprocessing
 import os
+import pickle
 import re
-import subprocess
-from dataclasses import dataclass
+import signal
+import time
+import traceback
+from dataclasses import dataclass, replace
+from functools import partial
+from operator import itemgetter
 from typing import Any, Dict, Tuple, Optional, List
 import sys
 
-import pandas as pd
-
 # === Paths / Config ===
 SRC_DIR = "pandas_src"
 OUTPUT_CSV = "output/pandas_grades.csv"
+# Grade results keyed by (path, mtime_ns, size); delete to force a full regrade
+RUN_CACHE_PKL = "output/.pandas_run_cache.pkl"
+# Shared bytecode cache for student scripts (PYTHONPYCACHEPREFIX equivalent)
+PYCACHE_PREFIX = os.path.abspath("output/.pycache")
 TIMEOUT_SECS = 8
+# Modules imported once in the forkserver so every worker starts warm
+PRELOAD_MODULES = ["__main__", "pandas"]
 
 # === Expected answers (literal form, if students print Python objects) ===
 EXPECTED = {
@@ -48,40 +65,119 @@ HEADERS = {
     "sorted_result": "✅ Sorted Result:",
     "top_user": "🏆 Top User:",
 }
-
-@dataclass
+# Captured stdout is the UTF-8 bytes decoded as latin-1 (one byte per char,
+# see run_student_file), so search for the headers in that same form
+STDOUT_HEADERS = {k: h.encode("utf-8").decode("latin-1") for k, h in HEADERS.items()}
+
+# Output CSV schema; csv_row() yields values in this order
+CSV_COLUMNS = (
+    "student_id", "filename", "grade",
+    "joined_pts", "grouped_pts", "sorted_pts", "top_user_pts",
+    "remarks",
+)
+
+# Bump when the cached GradeResult format changes
+RUN_CACHE_VERSION = 4
+_RUN_CACHE: Dict[Tuple[str, int, int], "GradeResult"] = {}
+
+class StudentTimeout(BaseException):
+    """Raised inside a worker when a student script exceeds TIMEOUT_SECS."""
+
+def _raise_timeout(signum, frame):
+    raise StudentTimeout
+
+class _KeepOpenBytesIO(io.BytesIO):
+    """Capture buffer that stays readable if the script closes sys.stdout."""
+    def close(self) -> None:
+        pass
+
+class _KeepOpenStringIO(io.StringIO):
+    """Capture buffer that stays readable if the script closes sys.stderr."""
+    def close(self) -> None:
+        pass
+
+@dataclass(slots=True)
 class GradeResult:
     student_id: str
     filename: str
     total: int
     breakdown: Dict[str, int]
     remarks: str
-    raw_stdout: str
-    raw_stderr: str
+    exit_code: int
+    # Only filled with --keep-output; otherwise dropped right after grading
+    raw_stdout: str = ""
+    raw_stderr: str = ""
 
 # ------------ Parsing helpers ------------
+# First characters a Python literal can start with (brackets, quotes,
+# numbers, True/False/None and string prefixes like b'' or r'')
+_LITERAL_START = frozenset("[{(\"'0123456789-+.TFNbBrRuU")
+# Lines json.loads could misread once single quotes become double quotes:
+# tuples, escapes, embedded double quotes and JSON-only keywords
+_JSON_UNSAFE = re.compile(r"[\"\\()]|true|false|null|NaN|Infinity")
+
 def safe_literal_eval(s: str) -> Any:
     """Safely evaluate a Python literal; returns None on failure."""
+    s = s.strip()
+    # Skip the parser for lines that cannot be literals (e.g. pandas table rows)
+    if not s or s[0] not in _LITERAL_START:
+        return None
+    # Fast path for list/dict reprs (e.g. joined, grouped): the C json parser
+    # gives the same objects without building an AST
+    if not _JSON_UNSAFE.search(s):
+        try:
+            return json.loads(s.replace("'", '"'))
+        except Exception:
+            pass
     try:
-        return ast.literal_eval(s.strip())
+        return ast.literal_eval(s)
     except Exception:
         return None
 
+def from_latin1_view(s: str) -> str:
+    """Decode a slice of the latin-1 stdout view back to the text that was printed."""
+    return s.encode("latin-1").decode("utf-8", "replace")
+
 def extract_after_header(stdout: str, header: str) -> Optional[Any]:
     """
-    Find `header` line, then parse the next non-empty line as a Python literal.
+    Find the first line that is exactly `header` (ignoring surrounding spaces),
+    then parse the next non-empty line as a Python literal.
+    Scans with str.find instead of splitting stdout into a list of lines.
+    `stdout` is the latin-1 view of the output; lines are decoded back to
+    UTF-8 text before the whitespace tests and evaluation, so Unicode
+    spaces (NBSP, U+3000, ...) are stripped like any other whitespace.
     Returns the parsed object or None if not found/parseable.
     """
-    lines = stdout.splitlines()
-    for i, line in enumerate(lines):
-        if line.strip() == header:
-            for j in range(i + 1, len(lines)):
-                nxt = lines[j].strip()
-                if nxt:
-                    return safe_literal_eval(nxt)
+    n = len(stdout)
+    idx = stdout.find(header)
+    while idx >= 0:
+        start = stdout.rfind("\n", 0, idx) + 1
+        end = stdout.find("\n", idx)
+        if end < 0:
+            end = n
+        before = from_latin1_view(stdout[start:idx])
+        after = from_latin1_view(stdout[idx + len(header):end])
+        if not before.strip() and not after.strip():
             break
+        idx = stdout.find(header, end)
+    else:
+        return None
+
+    j = end + 1
+    while j < n:
+        k = stdout.find("\n", j)
+        if k < 0:
+            k = n
+        nxt = from_latin1_view(stdout[j:k]).strip()
+        if nxt:
+            return safe_literal_eval(nxt)
+        j = k + 1
     return None
 
+def extract_headers(stdout: str) -> Dict[str, Optional[Any]]:
+    """Parse the block after every header; {key: parsed object or None}."""
+    return {key: extract_after_header(stdout, header) for key, header in STDOUT_HEADERS.items()}
+
 def compare_deep(a: Any, b: Any) -> bool:
     """Strict deep comparison."""
     return a == b
@@ -108,30 +204,28 @@ def grouped_fallback(stdout: str) -> bool:
     """Accept correct aggregate numbers (order-agnostic) in any table/block."""
     return (RE_G_A.search(stdout) is not None) and (RE_G_B.search(stdout) is not None)
 
-def sorted_fallback(stdout: str) -> bool:
+def section_start(stdout: str, key: str) -> int:
+    """Offset just past the first header for `key`, or 0 if it was not printed."""
+    header = STDOUT_HEADERS[key]
+    idx = stdout.find(header)
+    return idx + len(header) if idx >= 0 else 0
+
+def sorted_fallback(stdout: str, start: int) -> bool:
     """
     Ensure Alice line appears before Bob line (descending by total_spent)
-    somewhere in the 'Sorted Result' area or generally.
+    somewhere in the 'Sorted Result' area (from `start`) or generally.
     """
-    # Restrict to "Sorted Result" section if present
-    section = stdout
-    if "✅ Sorted Result:" in stdout:
-        section = stdout.split("✅ Sorted Result:", 1)[1]
-
-    ma = RE_G_A.search(section)
-    mb = RE_G_B.search(section)
+    ma = RE_G_A.search(stdout, start)
+    mb = RE_G_B.search(stdout, start)
     return bool(ma and mb and ma.start() < mb.start())
 
-def top_user_fallback(stdout: str) -> bool:
+def top_user_fallback(stdout: str, start: int) -> bool:
     """
     Accept typical pandas Series-like print for top user:
-    lines containing total_spent 250 and Name: Alice in the Top User block.
+    lines containing total_spent 250 and Name: Alice in the Top User block
+    (from `start`).
     """
-    # Prefer checking inside the 'Top User' block if present
-    block = stdout
-    if "🏆 Top User:" in stdout:
-        block = stdout.split("🏆 Top User:", 1)[1]
-    return bool(RE_TOP_NAME.search(block) and RE_TOP_VAL.search(block))
+    return bool(RE_TOP_NAME.search(stdout, start) and RE_TOP_VAL.search(stdout, start))
 
 # ------------ Grading ------------
 def grade_from_stdout(stdout: str) -> Tuple[int, Dict[str, int], List[str]]:
@@ -139,10 +233,7 @@ def grade_from_stdout(stdout: str) -> Tuple[int, Dict[str, int], List[str]]:
     remarks: List[str] = []
 
     # 1) Try strict literal parsing after each header
-    parsed = {}
-    for key, header in HEADERS.items():
-        obj = extract_after_header(stdout, header)
-        parsed[key] = obj
+    parsed = extract_headers(stdout)
 
     # 2) Score each key with literal compare OR fallbacks for pandas prints
     # joined
@@ -164,7 +255,7 @@ def grade_from_stdout(stdout: str) -> Tuple[int, Dict[str, int], List[str]]:
     # sorted_result
     if parsed["sorted_result"] is not None and compare_deep(parsed["sorted_result"], EXPECTED["sorted_result"]):
         breakdown["sorted_result"] = POINTS["sorted_result"]
-    elif sorted_fallback(stdout):
+    elif sorted_fallback(stdout, section_start(stdout, "sorted_result")):
         breakdown["sorted_result"] = POINTS["sorted_result"]
     else:
         remarks.append("sorted_result mismatch")
@@ -172,7 +263,7 @@ def grade_from_stdout(stdout: str) -> Tuple[int, Dict[str, int], List[str]]:
     # top_user
     if parsed["top_user"] is not None and compare_deep(parsed["top_user"], EXPECTED["top_user"]):
         breakdown["top_user"] = POINTS["top_user"]
-    elif top_user_fallback(stdout):
+    elif top_user_fallback(stdout, section_start(stdout, "top_user")):
         breakdown["top_user"] = POINTS["top_user"]
     else:
         remarks.append("top_user mismatch")
@@ -189,75 +280,233 @@ def student_id_from_filename(path: str) -> str:
     m = re.match(r"^(.+?)_", base)
     return m.group(1) if m else os.path.splitext(base)[0]
 
+def load_student_code(abs_path: str):
+    """
+    Compile a student script, reusing (or writing) its .pyc under PYCACHE_PREFIX.
+    The bytecode settings only apply to this call, not to what the script imports.
+    """
+    saved = sys.pycache_prefix, sys.dont_write_bytecode
+    # The cache lives under output/, so write it even if PYTHONDONTWRITEBYTECODE is set
+    sys.pycache_prefix, sys.dont_write_bytecode = PYCACHE_PREFIX, False
+    try:
+        return importlib.machinery.SourceFileLoader("__main__", abs_path).get_code("__main__")
+    finally:
+        sys.pycache_prefix, sys.dont_write_bytecode = saved
+
 def run_student_file(path: str) -> Tuple[str, str, int]:
     """
-    Run a student script in a subprocess and capture output.
+    Execute a student script inside a pool worker and capture output.
+    Mirrors `python3 path`: fresh globals, cwd set to the script's folder.
+    stdout is returned as its UTF-8 bytes decoded as latin-1: every char is
+    one byte, so the str stays compact even when the output contains emoji.
     """
     abs_path = os.path.abspath(path)
+    buf = _KeepOpenBytesIO()
+    out = io.TextIOWrapper(buf, encoding="utf-8", errors="backslashreplace")
+    err = _KeepOpenStringIO()
+    code = 0
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, TIMEOUT_SECS)
+    # Hard stop for scripts stuck where the alarm cannot interrupt them;
+    # the pool replaces the dead worker and main() reports a timeout
+    faulthandler.dump_traceback_later(TIMEOUT_SECS + 2, exit=True, file=sys.__stderr__)
+    try:
+        os.chdir(os.path.dirname(abs_path))
+        sys.argv = [abs_path]
+        # Like `python3 path`: the script's folder comes first, so sibling imports work
+        sys.path[0] = os.path.dirname(abs_path)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            compiled = load_student_code(abs_path)
+            exec(compiled, {"__name__": "__main__", "__file__": abs_path})
+    except StudentTimeout:
+        code = 124
+        if not err.getvalue():
+            err.write(f"Timed out after {TIMEOUT_SECS}s")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            err.write(f"{e.code}\n")
+            code = 1
+    except BaseException as e:
+        # Drop grader/importlib frames so the traceback starts at the student's code
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != abs_path:
+            tb = tb.tb_next
+        err.write("".join(traceback.format_exception(type(e), e, tb)))
+        code = 1
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        faulthandler.cancel_dump_traceback_later()
+    with contextlib.suppress(ValueError):
+        out.flush()
+    with buf.getbuffer() as view:
+        stdout = str(view, "latin-1")
+    return stdout, err.getvalue(), code
+
+def build_result(path: str, stdout: str, stderr: str, code: int,
+                 keep_output: bool = False) -> GradeResult:
+    """Grade one script's captured output; keep the raw text only if asked."""
+    if code != 0:
+        total = 0
+        breakdown = {k: 0 for k in POINTS}
+        remarks = [f"Script failed (exit {code}). Stderr: {stderr[:500]}"]
+    else:
+        total, breakdown, remarks = grade_from_stdout(stdout)
+
+    return GradeResult(
+        student_id=student_id_from_filename(path),
+        filename=os.path.basename(path),
+        total=total,
+        breakdown=breakdown,
+        remarks=" | ".join(remarks),
+        exit_code=code,
+        raw_stdout=from_latin1_view(stdout) if keep_output else "",
+        raw_stderr=stderr if keep_output else "",
+    )
+
+# Set in pool workers by _init_worker; run_and_grade reports task starts on it
+_STARTED = None
+
+def _init_worker(started) -> None:
+    """Pool initializer: keep the queue that task start times are posted to."""
+    global _STARTED
+    _STARTED = started
+
+def run_and_grade(path: str, keep_output: bool = False) -> GradeResult:
+    """Pool task: run a student script and grade it in the same worker."""
+    if _STARTED is not None:
+        _STARTED.put((os.path.basename(path), time.monotonic()))
+    try:
+        return build_result(path, *run_student_file(path), keep_output=keep_output)
+    except Exception:
+        # A grader-side error fails this student only, not the whole run
+        return build_result(path, "", traceback.format_exc(), 1)
+
+def csv_row(r: GradeResult) -> Tuple[str, str, int, int, int, int, int, str]:
+    """Flatten a result into a CSV_COLUMNS-ordered row."""
+    return (
+        r.student_id,
+        r.filename,
+        r.total,
+        r.breakdown["joined"],
+        r.breakdown["grouped"],
+        r.breakdown["sorted_result"],
+        r.breakdown["top_user"],
+        r.remarks,
+    )
+
+def list_student_files() -> List[os.DirEntry]:
+    """The '*.py' entries of SRC_DIR (same matches as glob), minus this grader."""
+    me = os.path.abspath(__file__)
+    with os.scandir(SRC_DIR) as it:
+        return [
+            e for e in it
+            if e.name.endswith(".py") and not e.name.startswith(".")
+            and e.is_file() and os.path.abspath(e.path) != me
+        ]
+
+def run_cache_key(entry: os.DirEntry) -> Tuple[str, int, int]:
+    """Identify a student file by absolute path, mtime and size."""
+    st = entry.stat()
+    return os.path.abspath(entry.path), st.st_mtime_ns, st.st_size
+
+def grader_stamp() -> Tuple[int, str, str]:
+    """Changes whenever this script, Python or pandas changes, invalidating cached grades."""
     try:
-        proc = subprocess.run(
-            [sys.executable, abs_path],
-            capture_output=True,
-            text=True,
-            timeout=TIMEOUT_SECS,
-            cwd=os.path.dirname(abs_path) or None
-        )
-        return proc.stdout, proc.stderr, proc.returncode
-    except subprocess.TimeoutExpired as e:
-        return e.stdout or "", e.stderr or f"Timed out after {TIMEOUT_SECS}s", 124
-    except Exception as e:
-        return "", str(e), 1
-
-def main():
+        pandas_version = importlib.metadata.version("pandas")
+    except importlib.metadata.PackageNotFoundError:
+        pandas_version = ""
+    return os.stat(os.path.abspath(__file__)).st_mtime_ns, sys.version, pandas_version
+
+def load_run_cache() -> None:
+    """Fill _RUN_CACHE from RUN_CACHE_PKL; a missing, corrupt or outdated file is ignored."""
+    try:
+        with open(RUN_CACHE_PKL, "rb") as f:
+            version, stamp, cache = pickle.load(f)
+        if version == RUN_CACHE_VERSION and stamp == grader_stamp():
+            _RUN_CACHE.update(cache)
+    except Exception:
+        pass
+
+def save_run_cache() -> None:
+    """Persist _RUN_CACHE atomically so an interrupted write never corrupts it."""
+    tmp = RUN_CACHE_PKL + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump((RUN_CACHE_VERSION, grader_stamp(), _RUN_CACHE), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, RUN_CACHE_PKL)
+
+def main(argv: Optional[List[str]] = None) -> List[GradeResult]:
+    parser = argparse.ArgumentParser(description="Grade the pandas assignment scripts in " + SRC_DIR)
+    parser.add_argument("--keep-output", action="store_true",
+                        help="keep each script's stdout/stderr on the returned results")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"reuse grades of unchanged scripts across runs via {RUN_CACHE_PKL}")
+    args = parser.parse_args(argv)
+
     os.makedirs(os.path.dirname(OUTPUT_CSV) or ".", exist_ok=True)
-    files = sorted(glob.glob(os.path.join(SRC_DIR, "*.py")))
+    # One scandir pass; DirEntry caches the stat used for the cache key.
+    # No need to sort here: rows are sorted when the CSV is written.
+    entries = list_student_files()
+    files = [e.path for e in entries]
     results: List[GradeResult] = []
 
+    # Only run files that changed since the last grading run (across invocations with --cache)
+    if args.cache:
+        load_run_cache()
+    keys = {e.path: run_cache_key(e) for e in entries}
+    misses = []
     for fpath in files:
-        # Don’t accidentally grade the grader if it sits in SRC_DIR
-        if os.path.abspath(fpath) == os.path.abspath(__file__):
-            continue
-
-        sid = student_id_from_filename(fpath)
-        stdout, stderr, code = run_student_file(fpath)
-
-        if code != 0:
-            total = 0
-            breakdown = {k: 0 for k in POINTS}
-            remarks = [f"Script failed (exit {code}). Stderr: {stderr[:500]}"]
+        # Cached grades carry no raw output, so --keep-output reruns everything
+        if not args.keep_output and keys[fpath] in _RUN_CACHE:
+            results.append(_RUN_CACHE[keys[fpath]])
         else:
-            total, breakdown, rmk = grade_from_stdout(stdout)
-            remarks = rmk
-
-        results.append(
-            GradeResult(
-                student_id=sid,
-                filename=os.path.basename(fpath),
-                total=total,
-                breakdown=breakdown,
-                remarks=" | ".join(remarks),
-                raw_stdout=stdout,
-                raw_stderr=stderr,
-            )
-        )
-
-    # Build CSV rows
-    rows = []
-    for r in results:
-        rows.append({
-            "student_id": r.student_id,
-            "filename": r.filename,
-            "grade": r.total,
-            "joined_pts": r.breakdown["joined"],
-            "grouped_pts": r.breakdown["grouped"],
-            "sorted_pts": r.breakdown["sorted_result"],
-            "top_user_pts": r.breakdown["top_user"],
-            "remarks": r.remarks,
-        })
-
-    df = pd.DataFrame(rows).sort_values(["student_id", "filename"])
-    df.to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
-    print(f"✅ Wrote {OUTPUT_CSV} with {len(df)} rows.")
+            misses.append(fpath)
+
+    if misses:
+        by_name = {os.path.basename(fpath): fpath for fpath in misses}
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(PRELOAD_MODULES)
+        # One task per worker: each student gets a clean interpreter forked
+        # from the warm forkserver, so pandas is only imported once overall
+        workers = min(32, len(misses), os.cpu_count() or 1)
+        started = ctx.SimpleQueue()
+        with ctx.Pool(workers, _init_worker, (started,), maxtasksperchild=1) as pool:
+            # Collect in completion order so slow scripts do not hold up the rest
+            done = pool.imap_unordered(partial(run_and_grade, keep_output=args.keep_output), misses)
+            start_times: Dict[str, float] = {}
+            while by_name:
+                while not started.empty():
+                    name, t = started.get()
+                    start_times[name] = t
+                try:
+                    r = done.next(1)
+                except multiprocessing.TimeoutError:
+                    # Time each script from its own start, not from its place in
+                    # the queue: it is only lost once its hard stop has passed
+                    now = time.monotonic()
+                    lost = [name for name in by_name if now > start_times.get(name, now) + TIMEOUT_SECS + 5]
+                    for name in lost:
+                        results.append(build_result(by_name.pop(name), "", f"Timed out after {TIMEOUT_SECS}s", 124))
+                    continue
+                fpath = by_name.pop(r.filename, None)
+                if fpath is None:
+                    # Already reported as timed out
+                    continue
+                results.append(r)
+                # Only clean runs are cached: a failure may be environmental
+                if r.exit_code == 0:
+                    _RUN_CACHE[keys[fpath]] = replace(r, raw_stdout="", raw_stderr="")
+        if args.cache:
+            save_run_cache()
+
+    rows = sorted(map(csv_row, results), key=itemgetter(0, 1))
+    with open(OUTPUT_CSV, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(rows)
+    print(f"✅ Wrote {OUTPUT_CSV} with {len(rows)} rows.")
+    return results
 
 if __name__ == "__main__":
     main()